@@ -3,13 +3,132 @@ Flask web UI for Wikidata Knowledge Graph Explorer.
 Provides an interactive graph interface backed by traverse.py functions.
 """
 
-from flask import Flask, render_template, request, jsonify
-import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import os
+import threading
+import time
+
+from cachetools import LRUCache, TTLCache
+from flask import Flask, Response, render_template, request, jsonify
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+import orjson
 import requests as http_requests
+from requests.adapters import HTTPAdapter
 
 import traverse
 
+
+class OrJSONProvider(JSONProvider):
+    """JSON provider that serializes via orjson instead of stdlib json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrJSONProvider(app)
+
+# Compress JSON graph payloads (Brotli for modern browsers, gzip otherwise).
+# text/event-stream is not in the default mimetype list, so /api/generate
+# tokens are still flushed as they arrive.
+app.config["COMPRESS_MIN_SIZE"] = 1024
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+Compress(app)
+
+
+def _json(payload, status=200):
+    """Build a JSON response from orjson bytes, skipping jsonify's str round-trip."""
+    return Response(orjson.dumps(payload), status=status, mimetype="application/json")
+
+
+def _strip_think_stream(chunks):
+    """
+    Removes <think>...</think> blocks (and trailing whitespace) emitted by
+    reasoning models like qwen3 from a stream of text fragments.
+    Tags may be split across fragments, so a possible partial "<think>" tail
+    is held back until the next fragment arrives. An unclosed <think> is
+    emitted as-is when the stream ends.
+    """
+    buf = ""
+    in_think = False
+    skip_ws = True  # also drops leading whitespace, like str.strip()
+    scan = 0
+    for chunk in chunks:
+        buf += chunk
+        out = []
+        while buf:
+            if in_think:
+                k = buf.find("</think>", scan)
+                if k < 0:
+                    scan = max(len("<think>"), len(buf) - len("</think>") + 1)
+                    break
+                buf = buf[k + len("</think>"):]
+                in_think = False
+                skip_ws = True
+                continue
+            if skip_ws:
+                buf = buf.lstrip()
+                if not buf:
+                    break
+                skip_ws = False
+            j = buf.find("<think>")
+            if j >= 0:
+                out.append(buf[:j])
+                buf = buf[j:]
+                in_think = True
+                scan = len("<think>")
+                continue
+            # Hold back a tail that could be the start of a split "<think>"
+            keep = next(
+                (n for n in range(min(6, len(buf)), 0, -1)
+                 if "<think>".startswith(buf[-n:])),
+                0,
+            )
+            out.append(buf[:len(buf) - keep])
+            buf = buf[len(buf) - keep:]
+            break
+        if out:
+            yield "".join(out)
+    if buf:
+        yield buf
+
+
+def _ollama_tokens(resp):
+    """Yields response text fragments from an Ollama NDJSON stream."""
+    for line in resp.iter_lines():
+        if not line:
+            continue
+        chunk = orjson.loads(line)
+        if chunk.get("error"):
+            raise RuntimeError(chunk["error"])
+        yield chunk.get("response", "")
+        if chunk.get("done"):
+            break
+
+
+def _sse(payload):
+    """Encode one server-sent event carrying a JSON payload."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def _generate_events(resp):
+    """Relays an Ollama stream to the browser as {token}/{error}/{done} events."""
+    with resp:
+        try:
+            for text in _strip_think_stream(_ollama_tokens(resp)):
+                if text:
+                    yield _sse({"token": text})
+            yield _sse({"done": True})
+        except http_requests.exceptions.Timeout:
+            yield _sse({"error": "Ollama request timed out."})
+        except Exception as e:
+            yield _sse({"error": f"Ollama error: {str(e)}"})
+
 
 # --- Startup: load config and set traverse module globals ---
 config = traverse.load_config()
@@ -17,6 +136,88 @@ traverse.USER_AGENT = config["user_agent"]
 traverse.HEADERS = {"User-Agent": config["user_agent"]}
 traverse.LIMIT_RELATIONS = config["limit_relations"]
 traverse.LIMIT_RELATIONS_DEEP = config["limit_relations_deep"]
+EXPAND_LIMIT = config.get("expand_limit", 15)
+OLLAMA_URL = config.get("ollama_endpoint", "http://localhost:11434")
+DEFAULT_MODEL = config.get("ollama_model", "qwen3:8b")
+
+# Keep-alive connection pool for Ollama calls
+_sess = http_requests.Session()
+_sess.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+_sess.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+# Latest Ollama model list, refreshed by _poll_models so /api/models never blocks
+_models_cache = {"models": []}
+MODELS_POLL_INTERVAL = 10
+
+
+def _fetch_models():
+    """Query Ollama for installed models. Returns the /api/models payload."""
+    try:
+        resp = _sess.get(f"{OLLAMA_URL}/api/tags", timeout=2)
+        resp.raise_for_status()
+        data = resp.json()
+        return {"models": [m["name"] for m in data.get("models", [])]}
+    except http_requests.exceptions.ConnectionError:
+        return {
+            "models": [],
+            "error": "Could not connect to Ollama. Is it running?"
+        }
+    except Exception as e:
+        return {"models": [], "error": str(e)}
+
+
+def _poll_models():
+    """Background loop keeping _models_cache in sync with Ollama."""
+    global _models_cache
+    while True:
+        _models_cache = _fetch_models()
+        time.sleep(MODELS_POLL_INTERVAL)
+
+
+threading.Thread(target=_poll_models, daemon=True).start()
+
+# Shared pool for overlapping independent upstream HTTP calls within a request
+_io_pool = ThreadPoolExecutor(max_workers=8)
+
+# Pre-serialized responses for repeat searches/traversals/expansions (10 min TTL)
+_search_cache = TTLCache(maxsize=1024, ttl=600)
+_traverse_cache = TTLCache(maxsize=4096, ttl=600)
+_expand_cache = TTLCache(maxsize=4096, ttl=600)
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache, key):
+    """Return a cached JSON response for key, or None on a miss."""
+    with _cache_lock:
+        body = cache.get(key)
+    if body is None:
+        return None
+    return Response(body, mimetype="application/json")
+
+
+def _cache_put(cache, key, payload):
+    """Serialize payload, store it under key, and return it as a response."""
+    body = orjson.dumps(payload)
+    with _cache_lock:
+        cache[key] = body
+    return Response(body, mimetype="application/json")
+
+
+# Entity/property id → English label, shared across requests. Property labels
+# (P31, P279, ...) repeat on nearly every entity, so most lookups hit here.
+_label_cache = LRUCache(maxsize=65536)
+
+
+def _resolve_labels_cached(ids):
+    """resolve_labels() that only asks Wikidata for ids not already cached."""
+    with _cache_lock:
+        missing = {i for i in ids if i not in _label_cache}
+    if missing:
+        fresh = traverse.resolve_labels(missing)
+        with _cache_lock:
+            _label_cache.update(fresh)
+    with _cache_lock:
+        return {i: _label_cache[i] for i in ids if i in _label_cache}
 
 
 @app.route("/")
@@ -30,7 +231,12 @@ def api_search():
     data = request.get_json()
     term = data.get("term", "").strip()
     if not term:
-        return jsonify({"error": "No search term provided"}), 400
+        return _json({"error": "No search term provided"}, 400)
+
+    key = (term,)
+    cached = _cache_get(_search_cache, key)
+    if cached is not None:
+        return cached
 
     candidates = traverse.search_entity(term)
     results = []
@@ -40,7 +246,9 @@ def api_search():
             "label": item.get("label", "No Label"),
             "description": item.get("description", ""),
         })
-    return jsonify({"results": results})
+    if not results:
+        return _json({"results": results})
+    return _cache_put(_search_cache, key, {"results": results})
 
 
 @app.route("/api/traverse", methods=["POST"])
@@ -50,58 +258,62 @@ def api_traverse():
     qid = data.get("qid", "").strip()
     label = data.get("label", qid)
     if not qid:
-        return jsonify({"error": "No QID provided"}), 400
+        return _json({"error": "No QID provided"}, 400)
+
+    key = (qid, label)
+    cached = _cache_get(_traverse_cache, key)
+    if cached is not None:
+        return cached
+
+    # Prefetch the root label while the REST entity fetch is in flight
+    fut_root_labels = _io_pool.submit(_resolve_labels_cached, {qid})
 
     # Fetch root entity via REST API
     entity_data = traverse.get_entity_rest(qid)
     if not entity_data:
-        return jsonify({"error": f"Could not retrieve entity {qid}"}), 500
+        return _json({"error": f"Could not retrieve entity {qid}"}, 500)
 
     raw_relations, ids_to_resolve = traverse.parse_entity_relations(
         entity_data, config["limit_relations"]
     )
-    ids_to_resolve.add(qid)
-    label_map = traverse.resolve_labels(ids_to_resolve)
+    # Only the neighbours still need resolving; the root is already in flight
+    label_map = _resolve_labels_cached(ids_to_resolve - {qid})
+    label_map.update(fut_root_labels.result())
     label_map.setdefault(qid, label)
 
     # Get sitelinks count for root
     root_sitelinks = len(entity_data.get("sitelinks", {}))
 
-    # Build Cytoscape-format nodes and edges
+    # Unique neighbour ids in first-seen order, then wrap into Cytoscape shape once
+    node_ids = [t for t in dict.fromkeys([t for _, t in raw_relations]) if t != qid]
+
+    # Bind hot-loop lookups to locals once
+    _lg = label_map.get
+
     nodes = [{
         "data": {
             "id": qid,
-            "label": label_map.get(qid, label),
+            "label": _lg(qid, label),
             "qid": qid,
             "depth": 0,
             "sitelinks": root_sitelinks,
         }
     }]
-    edges = []
-    seen_nodes = {qid}
-
-    for prop_id, target_qid in raw_relations:
-        if target_qid not in seen_nodes:
-            nodes.append({
-                "data": {
-                    "id": target_qid,
-                    "label": label_map.get(target_qid, target_qid),
-                    "qid": target_qid,
-                    "depth": 1,
-                    "sitelinks": 0,
-                }
-            })
-            seen_nodes.add(target_qid)
-        edges.append({
-            "data": {
-                "source": qid,
-                "target": target_qid,
-                "label": label_map.get(prop_id, prop_id),
-                "property": prop_id,
-            }
-        })
-
-    return jsonify({"nodes": nodes, "edges": edges})
+    nodes += [
+        {"data": {"id": n, "label": _lg(n, n), "qid": n,
+                  "depth": 1, "sitelinks": 0}}
+        for n in node_ids
+    ]
+    edges = [
+        {"data": {"source": qid, "target": t,
+                  "label": _lg(p, p), "property": p}}
+        for p, t in raw_relations
+    ]
+
+    if not edges or not ids_to_resolve <= label_map.keys():
+        # Missing item or a failed label batch (raw QIDs) — don't cache them
+        return _json({"nodes": nodes, "edges": edges})
+    return _cache_put(_traverse_cache, key, {"nodes": nodes, "edges": edges})
 
 
 @app.route("/api/expand", methods=["POST"])
@@ -110,22 +322,23 @@ def api_expand():
     data = request.get_json()
     qid = data.get("qid", "").strip()
     if not qid:
-        return jsonify({"error": "No QID provided"}), 400
+        return _json({"error": "No QID provided"}, 400)
 
-    limit = config.get("expand_limit", 15)
+    limit = EXPAND_LIMIT
 
-    # Forward edges: qid → targets
-    fwd_edges, fwd_labels, fwd_targets, fwd_sitelinks = traverse.sparql_fetch_level(
-        {qid}, limit, config
-    )
+    key = (qid, limit)
+    cached = _cache_get(_expand_cache, key)
+    if cached is not None:
+        return cached
 
-    # Reverse edges: sources → qid
-    rev_edges, rev_labels, rev_sources, rev_sitelinks = traverse.sparql_fetch_reverse(
-        {qid}, limit, config
-    )
+    # Forward (qid → targets) and reverse (sources → qid) in one SPARQL round-trip
+    fwd, rev = traverse.sparql_fetch_bidirectional(qid, limit, config)
+    fwd_edges, fwd_labels, fwd_targets, fwd_sitelinks = fwd
+    rev_edges, rev_labels, rev_sources, rev_sitelinks = rev
 
-    # Merge label maps
-    label_map = {**fwd_labels, **rev_labels}
+    # Merge label maps in place — fwd_labels is ours to mutate
+    label_map = fwd_labels
+    label_map.update(rev_labels)
 
     # Fallback: batch-resolve any IDs whose labels are still QIDs or URIs
     unresolved = set()
@@ -133,104 +346,97 @@ def api_expand():
         if label == qid_key or label.startswith("http://") or label.startswith("https://"):
             unresolved.add(qid_key)
     if unresolved:
-        fallback = traverse.resolve_labels(unresolved)
+        fallback = _resolve_labels_cached(unresolved)
         label_map.update(fallback)
 
-    nodes = []
-    edges = []
-    seen_nodes = set()
-
-    # Forward: new nodes are targets
-    for source_qid, prop_id, target_qid in fwd_edges:
-        if target_qid not in seen_nodes:
-            nodes.append({
-                "data": {
-                    "id": target_qid,
-                    "label": label_map.get(target_qid, target_qid),
-                    "qid": target_qid,
-                    "depth": -1,
-                    "sitelinks": fwd_sitelinks.get(target_qid, 0),
-                }
-            })
-            seen_nodes.add(target_qid)
-        edges.append({
-            "data": {
-                "source": source_qid,
-                "target": target_qid,
-                "label": label_map.get(prop_id, prop_id),
-                "property": prop_id,
-            }
-        })
+    # Forward sitelinks win for nodes discovered in both directions
+    sitelinks = rev_sitelinks
+    sitelinks.update(fwd_sitelinks)
 
-    # Reverse: new nodes are sources
-    for source_qid, prop_id, target_qid in rev_edges:
-        if source_qid not in seen_nodes:
-            nodes.append({
-                "data": {
-                    "id": source_qid,
-                    "label": label_map.get(source_qid, source_qid),
-                    "qid": source_qid,
-                    "depth": -1,
-                    "sitelinks": rev_sitelinks.get(source_qid, 0),
-                }
-            })
-            seen_nodes.add(source_qid)
-        edges.append({
-            "data": {
-                "source": source_qid,
-                "target": target_qid,
-                "label": label_map.get(prop_id, prop_id),
-                "property": prop_id,
-            }
-        })
+    # Bind hot-loop lookups to locals once
+    _lg = label_map.get
+    _sl = sitelinks.get
 
-    return jsonify({"nodes": nodes, "edges": edges})
+    # Single pass over forward then reverse edges: emit each edge and record
+    # the newly discovered endpoint (targets for forward, sources for reverse)
+    # in a dict used as an insertion-ordered set.
+    edges = []
+    node_ids = {}
+    _app_e = edges.append
+    n_fwd = len(fwd_edges)
+    for i, (s, p, t) in enumerate(chain(fwd_edges, rev_edges)):
+        node_ids[t if i < n_fwd else s] = None
+        _app_e({"data": {"source": s, "target": t,
+                         "label": _lg(p, p), "property": p}})
+
+    nodes = [
+        {"data": {"id": n, "label": _lg(n, n), "qid": n,
+                  "depth": -1, "sitelinks": _sl(n, 0)}}
+        for n in node_ids
+    ]
+
+    if not edges:
+        # Empty results may be a transient SPARQL failure — don't cache them
+        return _json({"nodes": nodes, "edges": edges})
+    return _cache_put(_expand_cache, key, {"nodes": nodes, "edges": edges})
+
+
+@app.route("/api/cache/clear", methods=["POST"])
+def api_cache_clear():
+    """Drop all cached search/traverse/expand responses and labels."""
+    with _cache_lock:
+        _search_cache.clear()
+        _traverse_cache.clear()
+        _expand_cache.clear()
+        _label_cache.clear()
+    return _json({"cleared": True})
 
 
 @app.route("/api/models", methods=["GET"])
 def api_models():
-    """Return list of locally available Ollama models."""
-    ollama_url = config.get("ollama_endpoint", "http://localhost:11434")
-    try:
-        resp = http_requests.get(f"{ollama_url}/api/tags", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        names = [m["name"] for m in data.get("models", [])]
-        return jsonify({"models": names})
-    except http_requests.exceptions.ConnectionError:
-        return jsonify({
-            "models": [],
-            "error": "Could not connect to Ollama. Is it running?"
-        })
-    except Exception as e:
-        return jsonify({"models": [], "error": str(e)})
+    """Return list of locally available Ollama models (refreshed in the background)."""
+    return _json(_models_cache)
 
 
-@app.route("/api/generate", methods=["POST"])
-def api_generate():
-    """Send triples to Ollama for question generation."""
-    data = request.get_json()
-    triples = data.get("triples", [])
-    fmt = data.get("format", "open")
-    graph_entities = data.get("graphEntities", [])
-    if not triples:
-        return jsonify({"error": "No triples provided"}), 400
+# --- Question-generation system prompts (static; only the MCQ entity list varies) ---
+_OPEN_PROMPT = """You generate quiz questions from knowledge graph triples.
+Each triple is: Subject -- Predicate -- Object.
 
-    triples_text = "\n".join(
-        f"{t['subject']} -- {t['predicate']} -- {t['object']}"
-        for t in triples
-    )
+Output exactly 5 questions using this format:
 
-    if fmt == "mcq":
-        entities_list = ", ".join(graph_entities) if graph_entities else ""
-        system_prompt = f"""You generate multiple choice quiz questions from knowledge graph triples.
+[RECALL] 1. Question about a fact directly stated in the triples
+[RECALL] 2. Question about a fact directly stated in the triples
+[CONNECT] 3. Question about how two entities relate to each other
+[CONNECT] 4. Question about how two entities relate to each other
+[INFER] 5. Question requiring reasoning beyond what is explicitly stated
+
+Example input:
+Marie Curie -- place of birth -- Warsaw
+Marie Curie -- field of work -- physics
+Marie Curie -- award received -- Nobel Prize in Physics
+
+Example output:
+[RECALL] 1. Where was Marie Curie born?
+[RECALL] 2. What award did Marie Curie receive?
+[CONNECT] 3. What is the connection between Marie Curie's field of work and the award she received?
+[CONNECT] 4. How does Marie Curie's place of birth relate to her nationality?
+[INFER] 5. Based on her receiving the Nobel Prize in Physics, what can you infer about the significance of her contributions to science?
+
+Rules:
+- Output ONLY the 5 numbered questions, nothing else
+- Each line starts with a tag: [RECALL], [CONNECT], or [INFER]
+- No answers, no explanations, no preamble"""
+
+_MCQ_PROMPT_HEAD = """You generate multiple choice quiz questions from knowledge graph triples.
 Each triple is: Subject -- Predicate -- Object.
 
 Output exactly 5 multiple choice questions. Each question has 4 options (A, B, C, D).
 Mark the correct answer by placing * after it.
 
 Use these entities from the knowledge graph as plausible distractors (wrong answers) where appropriate:
-{entities_list}
+"""
+
+_MCQ_PROMPT_TAIL = """
 
 Format:
 
@@ -272,69 +478,75 @@ Rules:
 - Vary which letter is correct across questions
 - Use entities from the provided list as plausible wrong answers where possible
 - No explanations, no preamble"""
-    else:
-        system_prompt = """You generate quiz questions from knowledge graph triples.
-Each triple is: Subject -- Predicate -- Object.
-
-Output exactly 5 questions using this format:
 
-[RECALL] 1. Question about a fact directly stated in the triples
-[RECALL] 2. Question about a fact directly stated in the triples
-[CONNECT] 3. Question about how two entities relate to each other
-[CONNECT] 4. Question about how two entities relate to each other
-[INFER] 5. Question requiring reasoning beyond what is explicitly stated
 
-Example input:
-Marie Curie -- place of birth -- Warsaw
-Marie Curie -- field of work -- physics
-Marie Curie -- award received -- Nobel Prize in Physics
+@app.route("/api/generate", methods=["POST"])
+def api_generate():
+    """Send triples to Ollama for question generation."""
+    data = request.get_json()
+    triples = data.get("triples", [])
+    fmt = data.get("format", "open")
+    graph_entities = data.get("graphEntities", [])
+    if not triples:
+        return jsonify({"error": "No triples provided"}), 400
 
-Example output:
-[RECALL] 1. Where was Marie Curie born?
-[RECALL] 2. What award did Marie Curie receive?
-[CONNECT] 3. What is the connection between Marie Curie's field of work and the award she received?
-[CONNECT] 4. How does Marie Curie's place of birth relate to her nationality?
-[INFER] 5. Based on her receiving the Nobel Prize in Physics, what can you infer about the significance of her contributions to science?
+    # str.join materializes its input anyway, so hand it a list directly
+    triples_text = "\n".join([
+        f"{t['subject']} -- {t['predicate']} -- {t['object']}"
+        for t in triples
+    ])
 
-Rules:
-- Output ONLY the 5 numbered questions, nothing else
-- Each line starts with a tag: [RECALL], [CONNECT], or [INFER]
-- No answers, no explanations, no preamble"""
+    if fmt == "mcq":
+        entities_list = ", ".join(graph_entities) if graph_entities else ""
+        system_prompt = _MCQ_PROMPT_HEAD + entities_list + _MCQ_PROMPT_TAIL
+    else:
+        system_prompt = _OPEN_PROMPT
 
     user_prompt = f"Triples:\n{triples_text}"
 
-    ollama_url = config.get("ollama_endpoint", "http://localhost:11434")
-    model = data.get("model") or config.get("ollama_model", "qwen3:8b")
+    model = data.get("model") or DEFAULT_MODEL
 
     try:
-        resp = http_requests.post(
-            f"{ollama_url}/api/generate",
+        resp = _sess.post(
+            f"{OLLAMA_URL}/api/generate",
             json={
                 "model": model,
                 "system": system_prompt,
                 "prompt": user_prompt,
-                "stream": False,
+                "stream": True,
             },
+            stream=True,
             timeout=120,
         )
-        resp.raise_for_status()
-        result = resp.json()
-        response_text = result.get("response", "")
-        # Strip <think>...</think> blocks from models like qwen3
-        response_text = re.sub(
-            r"<think>.*?</think>\s*", "", response_text, flags=re.DOTALL
-        )
-        return jsonify({"response": response_text.strip()})
     except http_requests.exceptions.ConnectionError:
         return jsonify({
             "error": "Could not connect to Ollama. Is it running? "
-                     f"(Expected at {ollama_url})"
+                     f"(Expected at {OLLAMA_URL})"
         }), 503
     except http_requests.exceptions.Timeout:
         return jsonify({"error": "Ollama request timed out."}), 504
     except Exception as e:
         return jsonify({"error": f"Ollama error: {str(e)}"}), 500
 
+    try:
+        resp.raise_for_status()
+    except Exception as e:
+        # e.g. 404 for an unknown model — release the pooled connection
+        resp.close()
+        return jsonify({"error": f"Ollama error: {str(e)}"}), 500
+
+    # Forward tokens as they arrive; <think> blocks are stripped on the fly
+    return Response(
+        _generate_events(resp),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5001)
+    # Debugger/reloader only when explicitly requested (FLASK_DEBUG=1)
+    app.run(
+        debug=os.environ.get("FLASK_DEBUG") == "1",
+        port=int(os.environ.get("PORT", "5001")),
+        threaded=True,
+    )
@@ -463,18 +463,28 @@ async function doGenerate() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(payload),
         });
-        var data = await resp.json();
 
-        if (data.error) {
-            outputDiv.innerHTML = '<div class="error">' + escapeHtml(data.error) + '</div>';
+        // Errors before streaming starts come back as plain JSON
+        var contentType = resp.headers.get('Content-Type') || '';
+        if (contentType.indexOf('text/event-stream') === -1) {
+            var data = await resp.json();
+            outputDiv.innerHTML = '<div class="error">' + escapeHtml(data.error || 'Generation failed.') + '</div>';
             status('Generation failed.');
             return;
         }
 
+        status('Receiving questions...');
+        var text = await readGenerateStream(resp, function(partial) {
+            outputDiv.innerHTML = '<div class="question-raw">' +
+                escapeHtml(partial).replace(/\n/g, '<br>') +
+                '</div>';
+        });
+        text = text.trim();
+
         if (format === 'mcq') {
-            outputDiv.innerHTML = renderMCQ(data.response);
+            outputDiv.innerHTML = renderMCQ(text);
         } else {
-            outputDiv.innerHTML = renderQuestions(data.response);
+            outputDiv.innerHTML = renderQuestions(text);
         }
         status('Questions generated.');
     } catch (err) {
@@ -483,6 +493,35 @@ async function doGenerate() {
     }
 }
 
+// Reads the /api/generate event stream, calling onProgress with the text so far.
+// Resolves with the full text; rejects if the server reports an error.
+async function readGenerateStream(resp, onProgress) {
+    var reader = resp.body.getReader();
+    var decoder = new TextDecoder();
+    var buffer = '';
+    var text = '';
+
+    while (true) {
+        var chunk = await reader.read();
+        if (chunk.done) break;
+        buffer += decoder.decode(chunk.value, { stream: true });
+
+        var events = buffer.split('\n\n');
+        buffer = events.pop();  // last piece may be incomplete
+        for (var i = 0; i < events.length; i++) {
+            if (events[i].indexOf('data: ') !== 0) continue;
+            var event = JSON.parse(events[i].slice(6));
+            if (event.error) throw new Error(event.error);
+            if (event.token) {
+                text += event.token;
+                onProgress(text);
+            }
+        }
+    }
+
+    return text;
+}
+
 // --- Render Questions ---
 
 function renderQuestions(text) {
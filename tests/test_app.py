@@ -0,0 +1,42 @@
+import random
+import re
+
+import pytest
+
+from app import _strip_think_stream
+
+
+def strip_think(text):
+    """The non-streaming behaviour _strip_think_stream replaced."""
+    return re.sub(r"<think>.*?</think>\s*", "", text, flags=re.DOTALL).strip()
+
+
+def stream(chunks):
+    # Trailing whitespace can't be known to be trailing mid-stream; the
+    # browser trims the final text.
+    return "".join(_strip_think_stream(chunks)).rstrip()
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    (["<think>plan</think>\n\nAnswer"], "Answer"),
+    (["<thi", "nk>plan</th", "ink>  Answer"], "Answer"),
+    (["A <", "think>x</think> B"], "A B"),
+    (["  \n", "Answer <", "/think> ok"], "Answer </think> ok"),
+    (["Answer <think>never closed"], "Answer <think>never closed"),
+    (["<think>", "never closed"], "<think>never closed"),
+    (["1 < 2"], "1 < 2"),
+    ([], ""),
+])
+def test_strip_think_stream_chunk_boundaries(chunks, expected):
+    assert stream(chunks) == expected
+    assert stream(chunks) == strip_think("".join(chunks))
+
+
+def test_strip_think_stream_matches_regex_for_any_split():
+    rng = random.Random(0)
+    pieces = ["<think>", "</think>", "<th", "ink>", "</", " ", "\n", "a", "b"]
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 4))))
+        chunks = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        assert stream(chunks) == strip_think(text), chunks
@@ -0,0 +1,33 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import traverse
+
+
+def test_sparql_timeout_is_not_retried(capsys):
+    hits = []
+
+    class SlowHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(1)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = {
+        "user_agent": "test",
+        "sparql_endpoint": f"http://127.0.0.1:{server.server_port}/sparql",
+        "sparql_timeout": 0.2,
+    }
+    try:
+        assert traverse.sparql_query("SELECT * WHERE {}", config) is None
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(hits) == 1
+    assert "[SPARQL] Query timed out" in capsys.readouterr().out
@@ -1,17 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+import random
 import re
 import requests
+from requests.adapters import HTTPAdapter
+import requests_cache
+from urllib3.util.retry import Retry
 import networkx as nx
+import orjson
+import matplotlib
 import matplotlib.pyplot as plt
 import sys
 import os
+import tempfile
+import threading
 import yaml
 
+try:
+    import igraph  # optional: C-core force-directed layout for visualize_schema
+except ImportError:
+    igraph = None
+
+# Serializes compute_layout's temporary swap of igraph's process-wide RNG
+_igraph_rng_lock = threading.Lock()
+
 # --- CONFIGURATION ---
 USER_AGENT = "Comp395_Student_Bot/1.0 (joel.walsh@example.edu)"  # CHANGE THIS!
 HEADERS = {"User-Agent": USER_AGENT}
 LIMIT_RELATIONS = 20  # Limit to avoid 'hairball' graphs for popular items like 'Earth'
 LIMIT_RELATIONS_DEEP = 5  # Tighter limit for deeper traversal levels
 
+_QID_RE = re.compile(r'^Q\d+$')
+_ENTITY_ID_RE = re.compile(r'^[QP]\d+$')
+
+# Background pool for overlapping independent requests (e.g. label prefetch)
+_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def configure_session(session):
+    """
+    Mounts a keep-alive connection pool with retry/backoff on transient
+    errors onto a requests session and returns it. 500 is not retried: WDQS
+    uses it for query timeouts, which would just time out again. Read
+    timeouts are not retried either (read=False re-raises them), so a slow
+    SPARQL query still fails once as requests.exceptions.Timeout.
+    POST is retried because wbgetentities POSTs are read-only.
+    """
+    retry = Retry(
+        total=3,
+        read=False,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Property labels (P31 → "instance of", ...) rarely change and a few hundred
+# cover most traversals, so they persist across runs in property_labels.json
+PROPERTY_LABEL_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "property_labels.json"
+)
+_property_labels_lock = threading.Lock()
+_property_labels_dirty = False
+
+
+def load_property_labels():
+    """
+    Reads the property label table from PROPERTY_LABEL_CACHE_PATH.
+    Returns {} if the file is missing or unreadable.
+    """
+    try:
+        with open(PROPERTY_LABEL_CACHE_PATH, "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Warning: Could not read {PROPERTY_LABEL_CACHE_PATH}: {e}")
+        return {}
+
+
+_PROPERTY_LABELS = load_property_labels()
+
+
+def remember_property_labels(labels):
+    """
+    Adds the property IDs (P...) from a {id: label} mapping to the in-memory
+    table. Nothing is written here; the CLI persists it via save_property_labels().
+    """
+    global _property_labels_dirty
+    with _property_labels_lock:
+        for pid, label in labels.items():
+            if pid[:1] == "P" and pid not in _PROPERTY_LABELS and label != pid:
+                _PROPERTY_LABELS[pid] = label
+                _property_labels_dirty = True
+
+
+def save_property_labels():
+    """
+    Rewrites property_labels.json if the table gained entries. Goes through a
+    unique temp file + os.replace so concurrent writers (other processes)
+    can never leave a mixed or truncated file behind.
+    """
+    global _property_labels_dirty
+    with _property_labels_lock:
+        if not _property_labels_dirty:
+            return
+        payload = orjson.dumps(
+            _PROPERTY_LABELS, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        )
+        _property_labels_dirty = False
+
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(PROPERTY_LABEL_CACHE_PATH),
+            prefix="property_labels.", suffix=".tmp", delete=False
+        ) as f:
+            tmp_path = f.name
+            f.write(payload)
+        os.replace(tmp_path, PROPERTY_LABEL_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not write {PROPERTY_LABEL_CACHE_PATH}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Shared session so REST, Action API and SPARQL calls reuse TLS connections.
+# requests already advertises gzip/deflate and decodes transparently.
+SESSION = configure_session(requests.Session())
+
 def load_config():
     """
     Loads config.yaml from the same directory as this script.
@@ -30,6 +150,11 @@ def load_config():
         "ollama_endpoint": "http://localhost:11434",
         "ollama_model": "qwen3:8b",
         "expand_limit": 50,
+        "max_concurrent": 16,
+        "cache_expire_after": 86400,
+        "show_plot": False,
+        "max_total_edges": 5000,
+        "max_total_entities": 2000,
     }
 
     config_path = os.path.join(
@@ -68,8 +193,8 @@ def search_entity(term):
     }
     
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
-        data = response.json()
+        response = SESSION.get(url, headers=HEADERS, params=params)
+        data = orjson.loads(response.content)
         return data.get("search", [])
     except Exception as e:
         print(f"Error searching: {e}")
@@ -82,24 +207,69 @@ def get_entity_rest(qid):
     """
     url = f"https://www.wikidata.org/w/rest.php/wikibase/v1/entities/items/{qid}"
     try:
-        response = requests.get(url, headers=HEADERS)
-        return response.json()
+        response = SESSION.get(url, headers=HEADERS)
+        return orjson.loads(response.content)
     except Exception as e:
         print(f"Error retrieving REST data: {e}")
         return None
 
+def fetch_entities_batch(qids):
+    """
+    Fetches claims + sitelinks + English labels for up to 50 entities in one
+    Action API call.
+    POSTs so long id lists don't hit URL length limits.
+    Returns {qid: entity_json} in Action API (wbgetentities) shape; redirected
+    ids are keyed under both the requested and the target id.
+    """
+    if not qids: return {}
+
+    url = "https://www.wikidata.org/w/api.php"
+    data = {
+        "action": "wbgetentities",
+        "ids": "|".join(qids),
+        "props": "claims|sitelinks|labels",
+        "languages": "en",
+        "format": "json"
+    }
+    try:
+        response = SESSION.post(url, headers=HEADERS, data=data)
+        entities = orjson.loads(response.content).get("entities", {})
+    except Exception as e:
+        print(f"Warning: Could not fetch entity batch: {e}")
+        return {}
+
+    result = {}
+    for qid, entity in entities.items():
+        if "missing" in entity:
+            continue
+        result[qid] = entity
+        redirect = entity.get("redirects")
+        if redirect:
+            result[redirect["from"]] = entity
+    return result
+
 def resolve_labels(qids):
     """
     Helper: Batch resolves QIDs to human-readable labels using Action API.
     Essential for making the graph readable (Cognitive Load management).
     Handles more than 50 QIDs by batching automatically.
+    Property labels come from the shared property_labels.json table when
+    present; callers pass only IDs they don't already have a label for.
     """
     if not qids: return {}
 
     url = "https://www.wikidata.org/w/api.php"
     mapping = {}
-    # Only send valid entity IDs (Q123, P456) to the API
-    qid_list = [q for q in qids if re.match(r'^[QP]\d+$', q)]
+    # Only send valid entity IDs (Q123, P456) missing from the table to the API.
+    # Sorted so identical ID sets produce identical (cacheable) batches.
+    qid_list = []
+    for q in sorted(set(qids)):
+        if not _ENTITY_ID_RE.match(q):
+            continue
+        if q in _PROPERTY_LABELS:
+            mapping[q] = _PROPERTY_LABELS[q]
+        else:
+            qid_list.append(q)
 
     # Action API allows up to 50 IDs per request — loop in batches
     for i in range(0, len(qid_list), 50):
@@ -112,7 +282,7 @@ def resolve_labels(qids):
             "format": "json"
         }
         try:
-            data = requests.get(url, headers=HEADERS, params=params).json()
+            data = orjson.loads(SESSION.get(url, headers=HEADERS, params=params).content)
             entities = data.get("entities", {})
             for qid, info in entities.items():
                 label = info.get("labels", {}).get("en", {}).get("value", qid)
@@ -120,6 +290,7 @@ def resolve_labels(qids):
         except Exception as e:
             print(f"Warning: Could not resolve labels for batch: {e}")
 
+    remember_property_labels(mapping)
     return mapping
 
 def parse_entity_relations(data, limit):
@@ -130,21 +301,57 @@ def parse_entity_relations(data, limit):
     ids_to_resolve = set()
     raw_relations = []
 
-    statements = data.get('statements', {})
+    # Bound methods hoisted out of the loop; this runs once per entity.
+    append = raw_relations.append
+    add = ids_to_resolve.add
+    is_qid = _QID_RE.match
+
+    for prop_id, claim_group in data.get('statements', {}).items():
+        if len(raw_relations) >= limit:
+            break
+
+        data_value = claim_group[0].get('value', {}).get('content', {})
+
+        if type(data_value) is str:
+            if not is_qid(data_value):
+                continue
+            target_id = data_value
+        elif type(data_value) is dict:
+            target_id = data_value.get('id')
+            if not target_id:
+                continue
+        else:
+            continue
+
+        append((prop_id, target_id))
+        add(prop_id)
+        add(target_id)
+
+    return raw_relations, ids_to_resolve
+
+
+def parse_entity_claims(data, limit):
+    """
+    Action API (wbgetentities) counterpart of parse_entity_relations().
+    Item-valued claims live at claims[prop][0]['mainsnak']['datavalue']['value']['id'].
+    Returns (raw_relations, ids_to_resolve).
+    """
+    ids_to_resolve = set()
+    raw_relations = []
+
+    claims = data.get('claims', {})
 
     count = 0
-    for prop_id, claim_group in statements.items():
+    for prop_id, claim_group in claims.items():
         if count >= limit:
             break
 
-        claim = claim_group[0]
-        data_value = claim.get('value', {}).get('content', {})
+        datavalue = claim_group[0].get('mainsnak', {}).get('datavalue', {})
+        value = datavalue.get('value')
 
         target_id = None
-        if isinstance(data_value, str) and re.match(r'^Q\d+$', data_value):
-            target_id = data_value
-        elif isinstance(data_value, dict):
-            target_id = data_value.get('id')
+        if datavalue.get('type') == 'wikibase-entityid' and value.get('entity-type') == 'item':
+            target_id = value.get('id')
 
         if target_id:
             raw_relations.append((prop_id, target_id))
@@ -166,14 +373,15 @@ def sparql_query(query, config):
         "Accept": "application/sparql-results+json",
     }
     try:
-        response = requests.get(
+        response = SESSION.get(
             config["sparql_endpoint"],
             headers=headers,
             params=params,
             timeout=config["sparql_timeout"],
         )
         response.raise_for_status()
-        return response.json()
+        # orjson parses large binding lists several times faster than stdlib json
+        return orjson.loads(response.content)
     except requests.exceptions.Timeout:
         print(f"  [SPARQL] Query timed out after {config['sparql_timeout']}s. "
               "Try reducing depth or limits.")
@@ -183,53 +391,26 @@ def sparql_query(query, config):
         return None
 
 
-def sparql_fetch_level(source_qids, limit, config):
+def parse_level_bindings(bindings, limit):
     """
-    Fetches all item-valued properties for a batch of entities in one SPARQL query.
+    Turns ?source ?prop ?target bindings into one BFS level, keeping at most
+    `limit` edges per source.
     Returns (edges, label_map, new_target_qids, sitelinks_map).
     """
-    if not source_qids:
-        return [], {}, set(), {}
-
-    values = " ".join(f"wd:{qid}" for qid in source_qids)
-
-    # Generous LIMIT so prolific entities (countries, etc.) can't starve
-    # smaller ones under SPARQL's arbitrary row ordering.
-    # Client-side per_source_count enforces the real per-entity cap.
-    total_limit = 100 * len(source_qids)
-
-    query = f"""
-SELECT ?source ?prop ?target ?sourceLabel ?propLabel ?targetLabel ?targetSitelinks
-WHERE {{
-  VALUES ?source {{ {values} }}
-  ?source ?wdt ?target .
-  ?prop wikibase:directClaim ?wdt .
-  OPTIONAL {{ ?target wikibase:sitelinks ?targetSitelinks . }}
-  FILTER(ISIRI(?target))
-  FILTER(STRSTARTS(STR(?target), STR(wd:)))
-  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-}}
-LIMIT {total_limit}
-"""
-
-    result = sparql_query(query, config)
-    if not result:
-        return [], {}, set(), {}
-
     edges = []
     label_map = {}
     new_targets = set()
     sitelinks_map = {}
     per_source_count = {}
 
-    for binding in result.get("results", {}).get("bindings", []):
+    for binding in bindings:
         source_uri = binding["source"]["value"]
         prop_uri = binding["prop"]["value"]
         target_uri = binding["target"]["value"]
 
-        source_qid = source_uri.rsplit("/", 1)[-1]
-        prop_id = prop_uri.rsplit("/", 1)[-1]
-        target_qid = target_uri.rsplit("/", 1)[-1]
+        source_qid = source_uri.rpartition("/")[2]
+        prop_id = prop_uri.rpartition("/")[2]
+        target_qid = target_uri.rpartition("/")[2]
 
         # Enforce per-source limit client-side
         per_source_count.setdefault(source_qid, 0)
@@ -241,10 +422,8 @@ LIMIT {total_limit}
         new_targets.add(target_qid)
 
         # Collect sitelinks count
-        try:
-            sitelinks_map[target_qid] = int(binding.get("targetSitelinks", {}).get("value", 0))
-        except (ValueError, TypeError):
-            sitelinks_map[target_qid] = 0
+        sitelinks = binding.get("targetSitelinks", {}).get("value", "")
+        sitelinks_map[target_qid] = int(sitelinks) if sitelinks.isdecimal() else 0
 
         # Collect labels from SERVICE wikibase:label
         source_label = binding.get("sourceLabel", {}).get("value", source_qid)
@@ -258,6 +437,61 @@ LIMIT {total_limit}
     return edges, label_map, new_targets, sitelinks_map
 
 
+# Query templates for one BFS level, filled with str.format(values=..., limit=...)
+_SPARQL_LEVEL_TEMPLATE = """
+SELECT ?source ?prop ?target ?sourceLabel ?propLabel ?targetLabel ?targetSitelinks
+WHERE {{
+  VALUES ?source {{ {values} }}
+  ?source ?wdt ?target .
+  ?prop wikibase:directClaim ?wdt .
+  OPTIONAL {{ ?target wikibase:sitelinks ?targetSitelinks . }}
+  FILTER(ISIRI(?target))
+  FILTER(STRSTARTS(STR(?target), STR(wd:)))
+  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
+}}
+LIMIT {limit}
+"""
+
+_SPARQL_REVERSE_TEMPLATE = """
+SELECT ?source ?prop ?target ?sourceLabel ?propLabel ?targetLabel ?sourceSitelinks
+WHERE {{
+  VALUES ?target {{ {values} }}
+  ?source ?wdt ?target .
+  ?prop wikibase:directClaim ?wdt .
+  OPTIONAL {{ ?source wikibase:sitelinks ?sourceSitelinks . }}
+  FILTER(ISIRI(?source))
+  FILTER(STRSTARTS(STR(?source), STR(wd:)))
+  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
+}}
+LIMIT {limit}
+"""
+
+
+def sparql_fetch_level(source_qids, limit, config):
+    """
+    Fetches all item-valued properties for a batch of entities in one SPARQL query.
+    Returns (edges, label_map, new_target_qids, sitelinks_map).
+    """
+    if not source_qids:
+        return [], {}, set(), {}
+
+    # Sorted so the same frontier always yields the same query (and cache key)
+    values = " ".join(map("wd:{}".format, sorted(source_qids)))
+
+    # Generous LIMIT so prolific entities (countries, etc.) can't starve
+    # smaller ones under SPARQL's arbitrary row ordering.
+    # Client-side per_source_count enforces the real per-entity cap.
+    total_limit = 100 * len(source_qids)
+
+    query = _SPARQL_LEVEL_TEMPLATE.format(values=values, limit=total_limit)
+
+    result = sparql_query(query, config)
+    if not result:
+        return [], {}, set(), {}
+
+    return parse_level_bindings(result.get("results", {}).get("bindings", []), limit)
+
+
 def sparql_fetch_reverse(target_qids, limit, config):
     """
     Fetches incoming edges for a batch of entities in one SPARQL query.
@@ -268,23 +502,11 @@ def sparql_fetch_reverse(target_qids, limit, config):
     if not target_qids:
         return [], {}, set(), {}
 
-    values = " ".join(f"wd:{qid}" for qid in target_qids)
+    values = " ".join(map("wd:{}".format, sorted(target_qids)))
 
     total_limit = 100 * len(target_qids)
 
-    query = f"""
-SELECT ?source ?prop ?target ?sourceLabel ?propLabel ?targetLabel ?sourceSitelinks
-WHERE {{
-  VALUES ?target {{ {values} }}
-  ?source ?wdt ?target .
-  ?prop wikibase:directClaim ?wdt .
-  OPTIONAL {{ ?source wikibase:sitelinks ?sourceSitelinks . }}
-  FILTER(ISIRI(?source))
-  FILTER(STRSTARTS(STR(?source), STR(wd:)))
-  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-}}
-LIMIT {total_limit}
-"""
+    query = _SPARQL_REVERSE_TEMPLATE.format(values=values, limit=total_limit)
 
     result = sparql_query(query, config)
     if not result:
@@ -301,9 +523,9 @@ LIMIT {total_limit}
         prop_uri = binding["prop"]["value"]
         target_uri = binding["target"]["value"]
 
-        source_qid = source_uri.rsplit("/", 1)[-1]
-        prop_id = prop_uri.rsplit("/", 1)[-1]
-        target_qid = target_uri.rsplit("/", 1)[-1]
+        source_qid = source_uri.rpartition("/")[2]
+        prop_id = prop_uri.rpartition("/")[2]
+        target_qid = target_uri.rpartition("/")[2]
 
         # Enforce per-target limit client-side
         per_target_count.setdefault(target_qid, 0)
@@ -315,10 +537,8 @@ LIMIT {total_limit}
         new_sources.add(source_qid)
 
         # Collect sitelinks count for newly discovered source nodes
-        try:
-            sitelinks_map[source_qid] = int(binding.get("sourceSitelinks", {}).get("value", 0))
-        except (ValueError, TypeError):
-            sitelinks_map[source_qid] = 0
+        sitelinks = binding.get("sourceSitelinks", {}).get("value", "")
+        sitelinks_map[source_qid] = int(sitelinks) if sitelinks.isdecimal() else 0
 
         # Collect labels from SERVICE wikibase:label
         source_label = binding.get("sourceLabel", {}).get("value", source_qid)
@@ -332,6 +552,116 @@ LIMIT {total_limit}
     return edges, label_map, new_sources, sitelinks_map
 
 
+def sparql_fetch_bidirectional(qid, limit, config):
+    """
+    Fetches outgoing AND incoming edges for a single entity in one SPARQL query.
+    Each direction is a LIMITed subquery joined by UNION, tagged with ?dir
+    ("f" = forward, "r" = reverse), so a heavily-referenced entity can't
+    starve its own outgoing edges.
+    Returns ((fwd_edges, fwd_labels, fwd_targets, fwd_sitelinks),
+             (rev_edges, rev_labels, rev_sources, rev_sitelinks)).
+    """
+    query = f"""
+SELECT ?source ?prop ?target ?dir ?sourceLabel ?propLabel ?targetLabel ?sitelinks
+WHERE {{
+  {{
+    SELECT ?source ?prop ?target ?dir WHERE {{
+      BIND(wd:{qid} AS ?source)
+      ?source ?wdt ?target .
+      ?prop wikibase:directClaim ?wdt .
+      FILTER(ISIRI(?target))
+      FILTER(STRSTARTS(STR(?target), STR(wd:)))
+      BIND("f" AS ?dir)
+    }} LIMIT {limit}
+  }}
+  UNION
+  {{
+    SELECT ?source ?prop ?target ?dir WHERE {{
+      BIND(wd:{qid} AS ?target)
+      ?source ?wdt ?target .
+      ?prop wikibase:directClaim ?wdt .
+      FILTER(ISIRI(?source))
+      FILTER(STRSTARTS(STR(?source), STR(wd:)))
+      BIND("r" AS ?dir)
+    }} LIMIT {limit}
+  }}
+  BIND(IF(?dir = "f", ?target, ?source) AS ?neighbor)
+  OPTIONAL {{ ?neighbor wikibase:sitelinks ?sitelinks . }}
+  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
+}}
+"""
+
+    fwd = ([], {}, set(), {})
+    rev = ([], {}, set(), {})
+
+    result = sparql_query(query, config)
+    if not result:
+        return fwd, rev
+
+    for binding in result.get("results", {}).get("bindings", []):
+        source_uri = binding["source"]["value"]
+        prop_uri = binding["prop"]["value"]
+        target_uri = binding["target"]["value"]
+
+        source_qid = source_uri.rpartition("/")[2]
+        prop_id = prop_uri.rpartition("/")[2]
+        target_qid = target_uri.rpartition("/")[2]
+
+        # Forward rows discover targets, reverse rows discover sources
+        if binding["dir"]["value"] == "f":
+            edges, label_map, new_qids, sitelinks_map = fwd
+            neighbor_qid = target_qid
+        else:
+            edges, label_map, new_qids, sitelinks_map = rev
+            neighbor_qid = source_qid
+
+        edges.append((source_qid, prop_id, target_qid))
+        new_qids.add(neighbor_qid)
+
+        # Collect sitelinks count for the neighbor
+        sitelinks = binding.get("sitelinks", {}).get("value", "")
+        sitelinks_map[neighbor_qid] = int(sitelinks) if sitelinks.isdecimal() else 0
+
+        # Collect labels from SERVICE wikibase:label
+        source_label = binding.get("sourceLabel", {}).get("value", source_qid)
+        prop_label = binding.get("propLabel", {}).get("value", prop_id)
+        target_label = binding.get("targetLabel", {}).get("value", target_qid)
+
+        label_map[source_qid] = source_label
+        label_map[prop_id] = prop_label
+        label_map[target_qid] = target_label
+
+    return fwd, rev
+
+
+def extend_unique(edges, seen_edges, new_edges):
+    """
+    Appends each (source, prop, target) edge not already in seen_edges,
+    recording it there. Keeps repeated rows/revisits out of the traversal.
+    """
+    for edge in new_edges:
+        if edge not in seen_edges:
+            seen_edges.add(edge)
+            edges.append(edge)
+
+
+def traversal_capped(edges, visited, config):
+    """
+    Checks the whole-traversal size caps (max_total_edges, max_total_entities;
+    0 disables either). Returns True, after saying which one, once the BFS
+    should stop expanding.
+    """
+    max_edges = config["max_total_edges"]
+    max_entities = config["max_total_entities"]
+    if max_edges > 0 and len(edges) >= max_edges:
+        print(f"  [LIMIT] Edge cap hit ({len(edges)} >= {max_edges}) — stopping traversal")
+        return True
+    if max_entities > 0 and len(visited) >= max_entities:
+        print(f"  [LIMIT] Entity cap hit ({len(visited)} >= {max_entities}) — stopping traversal")
+        return True
+    return False
+
+
 def traverse_sparql(start_qid, start_label, max_depth, config):
     """
     Pure SPARQL BFS — one sparql_fetch_level() call per depth level.
@@ -340,6 +670,7 @@ def traverse_sparql(start_qid, start_label, max_depth, config):
     hub_threshold = config["max_entity_sitelinks"]
 
     edges = []
+    seen_edges = set()
     all_ids = {start_qid}
     depth_map = {start_qid: 0}
     label_map = {start_qid: start_label}
@@ -357,12 +688,12 @@ def traverse_sparql(start_qid, start_label, max_depth, config):
             frontier, limit, config
         )
 
-        edges.extend(level_edges)
+        extend_unique(edges, seen_edges, level_edges)
         label_map.update(level_labels)
 
-        for _, prop_id, target_qid in level_edges:
-            all_ids.add(prop_id)
-            all_ids.add(target_qid)
+        # new_targets already holds every level target; add the properties in bulk
+        all_ids.update(new_targets)
+        all_ids.update([prop_id for _, prop_id, _ in level_edges])
 
         # Next frontier = new targets not yet visited, filtered by hub threshold
         next_frontier = set()
@@ -378,6 +709,9 @@ def traverse_sparql(start_qid, start_label, max_depth, config):
 
         frontier = next_frontier
 
+        if traversal_capped(edges, visited, config):
+            break
+
     return edges, all_ids, depth_map, label_map
 
 
@@ -391,6 +725,7 @@ def traverse_hybrid(start_qid, start_label, max_depth, config):
     hub_threshold = config["max_entity_sitelinks"]
 
     edges = []
+    seen_edges = set()
     all_ids = {start_qid}
     depth_map = {start_qid: 0}
     label_map = {start_qid: start_label}
@@ -406,17 +741,21 @@ def traverse_hybrid(start_qid, start_label, max_depth, config):
     all_ids.update(ids_to_resolve)
 
     frontier = set()
+    extend_unique(edges, seen_edges, [(start_qid, p, t) for p, t in raw_relations])
     for prop_id, target_qid in raw_relations:
-        edges.append((start_qid, prop_id, target_qid))
         if target_qid not in visited:
             visited.add(target_qid)
             depth_map[target_qid] = 1
             frontier.add(target_qid)
 
-    # Resolve labels from REST depth (property IDs + target QIDs)
+    if traversal_capped(edges, visited, config):
+        frontier = set()
+
+    # Resolve labels from REST depth (property IDs + target QIDs) in the
+    # background — no data dependency with the SPARQL levels below.
+    # resolve_labels() answers known properties from _PROPERTY_LABELS.
     print(f"  [REST] Resolving {len(ids_to_resolve)} labels from root...")
-    rest_labels = resolve_labels(ids_to_resolve)
-    label_map.update(rest_labels)
+    label_future = _executor.submit(resolve_labels, ids_to_resolve)
 
     # --- Depth 1+: SPARQL ---
     for depth in range(1, max_depth):
@@ -428,12 +767,12 @@ def traverse_hybrid(start_qid, start_label, max_depth, config):
             frontier, config["limit_relations_deep"], config
         )
 
-        edges.extend(level_edges)
+        extend_unique(edges, seen_edges, level_edges)
         label_map.update(level_labels)
 
-        for _, prop_id, target_qid in level_edges:
-            all_ids.add(prop_id)
-            all_ids.add(target_qid)
+        # new_targets already holds every level target; add the properties in bulk
+        all_ids.update(new_targets)
+        all_ids.update([prop_id for _, prop_id, _ in level_edges])
 
         next_frontier = set()
         for t in new_targets:
@@ -448,61 +787,91 @@ def traverse_hybrid(start_qid, start_label, max_depth, config):
 
         frontier = next_frontier
 
+        if traversal_capped(edges, visited, config):
+            break
+
+    # REST labels only fill gaps so SPARQL labels still take precedence
+    for qid, label in label_future.result().items():
+        label_map.setdefault(qid, label)
+
     return edges, all_ids, depth_map, label_map
 
 
 def traverse(start_qid, start_label, max_depth, config):
     """
-    BFS traversal of Wikidata graph up to max_depth levels.
-    Returns (edges, all_ids, depth_map).
+    Level-synchronous BFS traversal of Wikidata graph up to max_depth levels.
+    Each level is fetched with wbgetentities in batches of 50 (batches run
+    concurrently, bounded by config["max_concurrent"]); entities are processed
+    in frontier order, so the output matches a sequential BFS.
+    Returns (edges, all_ids, depth_map, label_map).
       edges: list of (source_qid, property_id, target_qid)
       all_ids: set of all QIDs and property IDs to resolve
       depth_map: dict mapping qid -> depth level
+      label_map: labels of the fetched entities (from the same wbgetentities calls)
     """
-    from collections import deque
-
     hub_threshold = config["max_entity_sitelinks"]
 
-    visited = set()
+    visited = {start_qid}
     depth_map = {start_qid: 0}
     edges = []
+    seen_edges = set()
     all_ids = {start_qid}
-    queue = deque([(start_qid, 0)])
-    visited.add(start_qid)
-
-    while queue:
-        current_qid, current_depth = queue.popleft()
-
-        limit = LIMIT_RELATIONS if current_depth == 0 else LIMIT_RELATIONS_DEEP
-
-        print(f"  Fetching {current_qid} (depth {current_depth})...")
-        data = get_entity_rest(current_qid)
-        if not data:
-            continue
-
-        # Hub check: skip expansion for non-root entities above sitelinks threshold
-        if hub_threshold > 0 and current_depth > 0:
-            sitelink_count = len(data.get("sitelinks", {}))
-            if sitelink_count >= hub_threshold:
-                print(f"  [HUB] Skipping expansion of {current_qid} "
-                      f"({sitelink_count} sitelinks >= {hub_threshold})")
-                continue
-
-        raw_relations, ids = parse_entity_relations(data, limit)
-        all_ids.update(ids)
-
-        for prop_id, target_id in raw_relations:
-            edges.append((current_qid, prop_id, target_id))
-
-            if target_id not in visited:
-                visited.add(target_id)
-                depth_map[target_id] = current_depth + 1
-
-                # Only enqueue for further expansion if within depth limit
-                if current_depth + 1 < max_depth:
-                    queue.append((target_id, current_depth + 1))
+    label_map = {start_qid: start_label}
+    frontier = [start_qid]
+
+    with ThreadPoolExecutor(max_workers=config["max_concurrent"]) as pool:
+        for depth in range(max_depth):
+            if not frontier:
+                break
+
+            limit = LIMIT_RELATIONS if depth == 0 else LIMIT_RELATIONS_DEEP
+
+            print(f"  Fetching {len(frontier)} entities (depth {depth})...")
+            batches = [frontier[i:i+50] for i in range(0, len(frontier), 50)]
+            entities = {}
+            for batch_result in pool.map(fetch_entities_batch, batches):
+                entities.update(batch_result)
+
+            next_frontier = []
+            for current_qid in frontier:
+                data = entities.get(current_qid)
+                if not data:
+                    continue
+
+                label = data.get("labels", {}).get("en", {}).get("value")
+                if label:
+                    label_map.setdefault(current_qid, label)
+
+                # Hub check: skip expansion for non-root entities above sitelinks threshold
+                if hub_threshold > 0 and depth > 0:
+                    sitelink_count = len(data.get("sitelinks", {}))
+                    if sitelink_count >= hub_threshold:
+                        print(f"  [HUB] Skipping expansion of {current_qid} "
+                              f"({sitelink_count} sitelinks >= {hub_threshold})")
+                        continue
+
+                raw_relations, ids = parse_entity_claims(data, limit)
+                all_ids.update(ids)
+
+                extend_unique(edges, seen_edges,
+                              [(current_qid, p, t) for p, t in raw_relations])
+                for prop_id, target_id in raw_relations:
+                    if target_id not in visited:
+                        visited.add(target_id)
+                        depth_map[target_id] = depth + 1
+
+                        # Only expand further if within depth limit
+                        if depth + 1 < max_depth:
+                            next_frontier.append(target_id)
+
+                # Checked per entity so one large level can't overshoot far
+                if traversal_capped(edges, visited, config):
+                    next_frontier = []
+                    break
+
+            frontier = next_frontier
 
-    return edges, all_ids, depth_map
+    return edges, all_ids, depth_map, label_map
 
 
 def export_triples(center_label, edges, label_map, max_depth):
@@ -513,59 +882,99 @@ def export_triples(center_label, edges, label_map, max_depth):
     safe_name = center_label.replace(' ', '_')
     filename = f"{safe_name}_depth{max_depth}_triples.txt"
 
-    with open(filename, "w") as f:
-        for i, (source_qid, prop_id, target_qid) in enumerate(edges):
-            source_label = label_map.get(source_qid, source_qid)
-            prop_label = label_map.get(prop_id, prop_id)
-            target_label = label_map.get(target_qid, target_qid)
-            if i > 0:
-                f.write("\n")
-            f.write(f"{source_label} — {prop_label} — {target_label}\n")
+    lines = [
+        f"{label_map.get(s, s)} — {label_map.get(p, p)} — {label_map.get(t, t)}"
+        for s, p, t in edges
+    ]
+
+    # One buffered write instead of two per triple
+    with open(filename, "w", buffering=65536) as f:
+        if lines:
+            f.write("\n\n".join(lines) + "\n")
 
     print(f"[SUCCESS] Triples exported to: {filename}")
 
 
-def visualize_schema(center_label, edges, depth_map, label_map, max_depth):
+def compute_layout(G, k_value):
+    """
+    Force-directed node positions for G as {node: (x, y)}.
+    Uses igraph's C Fruchterman-Reingold when installed; otherwise (or for very
+    large graphs) networkx's spring_layout, which switches to its scipy sparse
+    solver above ~500 nodes.
+    k_value (spring_layout's node spacing) only applies to the networkx path:
+    igraph's Fruchterman-Reingold has no spacing parameter and derives it from
+    the node count itself.
+    """
+    if igraph is None or G.number_of_nodes() > 2000:
+        return nx.spring_layout(G, k=k_value, seed=42)
+
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    ig = igraph.Graph(
+        n=len(nodes),
+        edges=[(index[u], index[v]) for u, v in G.edges()],
+        directed=True,
+    )
+    # Fixed starting layout (seed=) plus a private RNG for FR's per-step
+    # jitter keep the picture reproducible. igraph's RNG is process-wide, so
+    # it is only swapped for this call and then restored to its default.
+    rng = random.Random(42)
+    seed = [[rng.random(), rng.random()] for _ in nodes]
+    with _igraph_rng_lock:
+        igraph.set_random_number_generator(rng)
+        try:
+            coords = ig.layout_fruchterman_reingold(niter=50, seed=seed).coords
+        finally:
+            igraph.set_random_number_generator(random)
+    return nx.rescale_layout_dict(dict(zip(nodes, coords)))
+
+
+def visualize_schema(center_label, edges, depth_map, label_map, max_depth, show=False):
     """
     Step 3: 'Externalizing the Mind'.
-    Draws the node-link diagram with depth-based coloring.
+    Draws the node-link diagram with depth-based coloring and saves it as PNG.
+    Only opens a window when show=True.
     """
     DEPTH_COLORS = ['lightcoral', 'skyblue', 'lightgreen', 'plum']
     DEPTH_SIZES = [3000, 2000, 1500, 1200]
 
-    G = nx.DiGraph()
-
     print(f"\nBuilding Graph for {center_label}...")
 
-    for source_qid, prop_id, target_qid in edges:
-        source_label = label_map.get(source_qid, source_qid)
-        target_label = label_map.get(target_qid, target_qid)
-        prop_label = label_map.get(prop_id, prop_id)
-        G.add_edge(source_label, target_label, label=prop_label)
+    # Map QIDs to labels once, then add every edge in a single batched call
+    ebunch = [
+        (label_map.get(s, s), label_map.get(t, t), {'label': label_map.get(p, p)})
+        for s, p, t in edges
+    ]
+    G = nx.DiGraph()
+    G.add_edges_from(ebunch)
+    edge_labels = {(u, v): attrs['label'] for u, v, attrs in ebunch}
 
     # Adaptive layout based on graph size
     num_nodes = G.number_of_nodes()
     fig_size = max(12, min(24, num_nodes // 5 + 12))
     k_value = max(0.3, 0.8 - (num_nodes / 200))
 
-    pos = nx.spring_layout(G, k=k_value, seed=42)
-
-    plt.figure(figsize=(fig_size, fig_size))
-
-    # Draw nodes by depth level
-    for depth in range(max_depth + 1):
-        # Find QIDs at this depth, map to labels
-        nodes_at_depth = [
-            label_map.get(qid, qid) for qid, d in depth_map.items()
-            if d == depth and label_map.get(qid, qid) in G.nodes()
-        ]
-        if nodes_at_depth:
-            color = DEPTH_COLORS[min(depth, len(DEPTH_COLORS) - 1)]
-            size = DEPTH_SIZES[min(depth, len(DEPTH_SIZES) - 1)]
-            nx.draw_networkx_nodes(
-                G, pos, nodelist=nodes_at_depth,
-                node_color=color, node_size=size, alpha=0.8
-            )
+    pos = compute_layout(G, k_value)
+
+    fig = plt.figure(figsize=(fig_size, fig_size))
+
+    # Depth of each drawn node in one pass over depth_map. If two QIDs share a
+    # label, the deeper one wins (it used to be drawn last, on top).
+    node_depth = {}
+    for qid, d in depth_map.items():
+        node_label = label_map.get(qid, qid)
+        if d <= max_depth and node_label in G:
+            node_depth[node_label] = max(d, node_depth.get(node_label, d))
+
+    # Draw all nodes in a single call, shallowest first so deeper levels stack on top
+    nodelist = sorted(node_depth, key=node_depth.get)
+    if nodelist:
+        nx.draw_networkx_nodes(
+            G, pos, nodelist=nodelist,
+            node_color=[DEPTH_COLORS[min(node_depth[n], len(DEPTH_COLORS) - 1)] for n in nodelist],
+            node_size=[DEPTH_SIZES[min(node_depth[n], len(DEPTH_SIZES) - 1)] for n in nodelist],
+            alpha=0.8
+        )
 
     # Draw Labels
     nx.draw_networkx_labels(G, pos, font_size=10, font_family="sans-serif")
@@ -573,8 +982,7 @@ def visualize_schema(center_label, edges, depth_map, label_map, max_depth):
     # Draw Edges
     nx.draw_networkx_edges(G, pos, width=1.0, alpha=0.5, arrows=True)
 
-    # Draw Edge Labels (the Predicates)
-    edge_labels = nx.get_edge_attributes(G, 'label')
+    # Draw Edge Labels (the Predicates) — collected while building G
     nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8)
 
     depth_str = f" (depth={max_depth})" if max_depth > 1 else ""
@@ -585,19 +993,36 @@ def visualize_schema(center_label, edges, depth_map, label_map, max_depth):
     filename = f"{safe_name}_depth{max_depth}_schema.png"
     plt.savefig(filename)
     print(f"\n[SUCCESS] Graph saved to: {filename}")
-    plt.show()
+    if show:
+        plt.show()
+    plt.close(fig)
 
 def main():
-    global USER_AGENT, HEADERS, LIMIT_RELATIONS, LIMIT_RELATIONS_DEEP
+    global USER_AGENT, HEADERS, LIMIT_RELATIONS, LIMIT_RELATIONS_DEEP, SESSION
 
     # 1. LOAD CONFIG
     config = load_config()
+    if not config["show_plot"]:
+        # Non-interactive backend: no GUI toolkit start-up, savefig only
+        matplotlib.use("Agg")
     USER_AGENT = config["user_agent"]
     HEADERS = {"User-Agent": USER_AGENT}
     LIMIT_RELATIONS = config["limit_relations"]
     LIMIT_RELATIONS_DEEP = config["limit_relations_deep"]
     mode = config["mode"]
 
+    # Persist HTTP responses across runs so popular entities aren't re-fetched.
+    # POST is included for fetch_entities_batch (wbgetentities).
+    if config["cache_expire_after"] > 0:
+        SESSION = configure_session(requests_cache.CachedSession(
+            "wikidata_cache",
+            backend="sqlite",
+            expire_after=config["cache_expire_after"],
+            allowable_methods=("GET", "HEAD", "POST"),
+        ))
+        print(f"[CONFIG] HTTP cache enabled (wikidata_cache.sqlite, "
+              f"expires after {config['cache_expire_after']}s)")
+
     hub_threshold = config["max_entity_sitelinks"]
     if hub_threshold > 0:
         print(f"[CONFIG] Hub filtering enabled: entities with >= {hub_threshold} sitelinks will not be expanded")
@@ -661,15 +1086,18 @@ def main():
           f"depth={max_depth}, mode={mode}...")
 
     if mode == "rest":
-        edges, all_ids, depth_map = traverse(selected_qid, selected_label, max_depth, config)
+        edges, all_ids, depth_map, label_map = traverse(
+            selected_qid, selected_label, max_depth, config
+        )
 
         if not edges:
             print("No relations found.")
             return
 
-        print(f"Resolving labels for {len(all_ids)} IDs...")
-        label_map = resolve_labels(all_ids)
-        label_map[selected_qid] = selected_label
+        # Expanded entities came back labeled; only leaves + properties remain
+        missing = all_ids - label_map.keys()
+        print(f"Resolving labels for {len(missing)} IDs...")
+        label_map.update(resolve_labels(missing))
 
     elif mode == "sparql":
         edges, all_ids, depth_map, label_map = traverse_sparql(
@@ -689,9 +1117,16 @@ def main():
             print("No relations found.")
             return
 
+    # SPARQL modes label properties via SERVICE wikibase:label; keep those too
+    remember_property_labels(label_map)
+    save_property_labels()
+
     # 6. OUTPUT
     export_triples(selected_label, edges, label_map, max_depth)
-    visualize_schema(selected_label, edges, depth_map, label_map, max_depth)
+    visualize_schema(
+        selected_label, edges, depth_map, label_map, max_depth,
+        show=config["show_plot"]
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production deployment under gevent.
+
+Monkey-patching must happen before anything imports socket/threading, so
+sockets used by requests and the thread pools in app.py become cooperative:
+
+    gunicorn -k gevent -w 2 --worker-connections 1000 wsgi:app
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+from app import app  # noqa: E402